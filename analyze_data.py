@@ -26,9 +26,27 @@ class ExperimentAnalyzer:
         self.data = self.extractor.create_analysis_dataset()
         return self
     
+    def _unique_by(self, key: str) -> pd.DataFrame:
+        """
+        Collapse the player-round panel to one row per player or round
+        
+        The panel is the population: players or rounds without any
+        playerRound scope (and rows whose key is missing) are not included.
+        """
+        if self.data is None:
+            return pd.DataFrame()
+        return self.data[self.data[key].notna()].drop_duplicates(key)
+    
+    def _disclosure_rows(self) -> pd.DataFrame:
+        """Restrict the player-round panel to rows with a disclosure decision"""
+        if self.data is None:
+            return pd.DataFrame()
+        return self.data.loc[self.data['has_disclosure'].astype(bool)]
+    
     def analyze_disclosure_patterns(self):
         """Analyze disclosure decision patterns"""
-        if self.data is None or self.data.empty:
+        data = self._disclosure_rows()
+        if data.empty:
             print("No data available")
             return
         
@@ -38,42 +56,42 @@ class ExperimentAnalyzer:
         
         # Overall disclosure rates
         print("\nOverall Disclosure Rates:")
-        disclosure_counts = self.data['disclosure_amount'].value_counts()
-        disclosure_pcts = self.data['disclosure_amount'].value_counts(normalize=True) * 100
+        disclosure_counts = data['disclosure_amount'].value_counts()
+        disclosure_pcts = data['disclosure_amount'].value_counts(normalize=True) * 100
         
         for amount in ['none', 'partial', 'full']:
             if amount in disclosure_counts.index:
                 print(f"  {amount.capitalize()}: {disclosure_counts[amount]} ({disclosure_pcts[amount]:.1f}%)")
         
         # By governance regime
-        if 'governance_regime' in self.data.columns:
+        if 'governance_regime' in data.columns:
             print("\nDisclosure by Governance Regime:")
             regime_disclosure = pd.crosstab(
-                self.data['governance_regime'],
-                self.data['disclosure_amount'],
+                data['governance_regime'],
+                data['disclosure_amount'],
                 normalize='index'
             ) * 100
             print(regime_disclosure.round(1))
         
         # By absorptive capacity
-        if 'absorptive_capacity' in self.data.columns:
+        if 'absorptive_capacity' in data.columns:
             print("\nDisclosure by Absorptive Capacity:")
             capacity_disclosure = pd.crosstab(
-                self.data['absorptive_capacity'],
-                self.data['disclosure_amount'],
+                data['absorptive_capacity'],
+                data['disclosure_amount'],
                 normalize='index'
             ) * 100
             print(capacity_disclosure.round(1))
         
         # Over time (by round)
-        if 'round_index' in self.data.columns:
+        if 'round_index' in data.columns:
             print("\nDisclosure Over Time:")
-            time_disclosure = self.data.groupby('round_index')['disclosure_amount'].value_counts(normalize=True).unstack(fill_value=0) * 100
+            time_disclosure = data.groupby('round_index')['disclosure_amount'].value_counts(normalize=True).unstack(fill_value=0) * 100
             print(time_disclosure.round(1))
     
     def analyze_ai_performance(self):
         """Analyze AI model accuracy over time"""
-        rounds_df = self.extractor.extract_rounds()
+        rounds_df = self._unique_by('round_id')
         
         if rounds_df.empty or 'ai_model_accuracy' not in rounds_df.columns:
             print("\nNo AI accuracy data available")
@@ -107,7 +125,8 @@ class ExperimentAnalyzer:
         print("="*60)
         
         # Disclosure in collaboration rounds
-        collab_data = self.data[self.data['task'] == 'collaboration']
+        disclosures = self._disclosure_rows()
+        collab_data = disclosures[disclosures['task'] == 'collaboration']
         if not collab_data.empty:
             print("\nCollaboration Phase Disclosure:")
             collab_disclosure = collab_data['disclosure_amount'].value_counts(normalize=True) * 100
@@ -115,7 +134,7 @@ class ExperimentAnalyzer:
                 print(f"  {amount.capitalize()}: {pct:.1f}%")
         
         # Competition strategies
-        comp_strategies = self.extractor.extract_competition_strategies()
+        comp_strategies = self.data[self.data['strategy'].notna()]
         if not comp_strategies.empty:
             print("\nCompetition Phase Strategies:")
             strategy_counts = comp_strategies['strategy'].value_counts(normalize=True) * 100
@@ -124,7 +143,7 @@ class ExperimentAnalyzer:
     
     def analyze_payoffs(self):
         """Analyze player payoffs"""
-        players_df = self.extractor.extract_players()
+        players_df = self._unique_by('player_id')
         
         if players_df.empty or 'total_payoff' not in players_df.columns:
             print("\nNo payoff data available")
@@ -139,6 +158,12 @@ class ExperimentAnalyzer:
         print(f"  Std: {players_df['total_payoff'].std():.2f}")
         print(f"  Min: {players_df['total_payoff'].min():.2f}")
         print(f"  Max: {players_df['total_payoff'].max():.2f}")
+        
+        # Per-round payoffs by phase
+        if 'payoff' in self.data.columns and self.data['payoff'].notna().any():
+            print("\nRound Payoff by Phase:")
+            phase_payoff = self.data.groupby('task', observed=True)['payoff'].agg(['mean', 'std', 'count'])
+            print(phase_payoff.round(2))
     
     def generate_visualizations(self, output_dir: str = "figures"):
         """Generate visualization plots"""
@@ -147,10 +172,12 @@ class ExperimentAnalyzer:
         
         sns.set_style("whitegrid")
         
+        disclosures = self._disclosure_rows()
+        
         # 1. Disclosure distribution
-        if self.data is not None and not self.data.empty:
+        if not disclosures.empty:
             plt.figure(figsize=(10, 6))
-            disclosure_counts = self.data['disclosure_amount'].value_counts()
+            disclosure_counts = disclosures['disclosure_amount'].value_counts()
             plt.bar(disclosure_counts.index, disclosure_counts.values)
             plt.title('Distribution of Disclosure Decisions')
             plt.xlabel('Disclosure Amount')
@@ -160,7 +187,7 @@ class ExperimentAnalyzer:
             print(f"✓ Saved disclosure_distribution.png")
         
         # 2. AI accuracy over time
-        rounds_df = self.extractor.extract_rounds()
+        rounds_df = self._unique_by('round_id')
         if not rounds_df.empty and 'ai_model_accuracy' in rounds_df.columns:
             plt.figure(figsize=(10, 6))
             round_accuracy = rounds_df.groupby('round_index')['ai_model_accuracy'].mean()
@@ -175,11 +202,11 @@ class ExperimentAnalyzer:
             print(f"✓ Saved ai_accuracy_over_time.png")
         
         # 3. Disclosure by governance regime
-        if self.data is not None and 'governance_regime' in self.data.columns:
+        if not disclosures.empty and 'governance_regime' in disclosures.columns:
             plt.figure(figsize=(12, 6))
             regime_disclosure = pd.crosstab(
-                self.data['governance_regime'],
-                self.data['disclosure_amount'],
+                disclosures['governance_regime'],
+                disclosures['disclosure_amount'],
                 normalize='index'
             ) * 100
             regime_disclosure.plot(kind='bar', stacked=False)
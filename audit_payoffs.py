@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Payoff Audit for the Cybersecurity Intelligence Sharing Experiment
+Recomputes the server-side leakage, detection and payoff rules and flags stored values that diverge
+"""
+
+import numpy as np
+import pandas as pd
+import argparse
+from typing import Dict
+from extract_data import EmpiricaDataExtractor
+
+
+# Game rules, mirrored from server/src/callbacks.js
+BASE_AI_ACCURACY = 0.5
+TELEMETRY_BONUS = 0.05
+VOLATILITY_PENALTY = 0.1
+MAX_ACCURACY = 0.95
+DEFAULT_BASELINE_DETECTION = 0.6
+LEARNING_RATES = {'high': 0.8}
+DEFAULT_LEARNING_RATE = 0.4
+DISCLOSURE_COSTS = {'full': 50.0, 'partial': 25.0}
+MAX_ATTACK_EXPOSURE = 100.0
+PAYOFF_PER_ATTACK = 10.0
+MAX_BASE_SCORE = 100.0
+SIGNAL_ADVANTAGE = 5.0
+REPUTATION_PENALTY = 20.0
+CONTRACT_VALUE = 200.0
+
+
+def _segment_cumsum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Inclusive cumulative sum restarting at each segment start"""
+    total = np.cumsum(values)
+    offsets = np.repeat(total[starts] - values[starts], np.diff(np.r_[starts, len(values)]))
+    return total - offsets
+
+
+class PayoffAuditor:
+    """Recompute per-round payoff components and compare them with stored values"""
+
+    def __init__(self, panel: pd.DataFrame, telemetry: pd.DataFrame,
+                 histories: pd.DataFrame, atol: float = 1e-6):
+        """
+        Initialize the auditor
+
+        Args:
+            panel: Player x round panel from EmpiricaDataExtractor.create_analysis_dataset()
+            telemetry: Round telemetry from EmpiricaDataExtractor.extract_round_telemetry()
+            histories: Player histories from EmpiricaDataExtractor.extract_player_histories()
+            atol: Absolute tolerance when comparing stored and recomputed values
+        """
+        self.panel = panel
+        self.telemetry = telemetry
+        self.histories = histories
+        self.atol = atol
+
+    @classmethod
+    def from_extractor(cls, extractor: EmpiricaDataExtractor, **kwargs) -> 'PayoffAuditor':
+        """Build an auditor from a data extractor"""
+        panel = extractor.create_analysis_dataset()
+        return cls(panel, extractor.extract_round_telemetry(), extractor.extract_player_histories(), **kwargs)
+
+    def _ordered_panel(self) -> pd.DataFrame:
+        """Sort rows by player and round order so histories are contiguous"""
+        panel = self.panel
+        for key in ('player_id', 'round_id', 'game_id'):
+            if not isinstance(panel[key].dtype, pd.CategoricalDtype):
+                panel = panel.assign(**{key: panel[key].astype('category')})
+
+        order = np.lexsort((
+            panel['round_index'].to_numpy(dtype=float, na_value=np.inf),
+            panel['player_id'].cat.codes.to_numpy(),
+        ))
+        return panel.iloc[order].reset_index(drop=True)
+
+    def _telemetry_counts(self, panel: pd.DataFrame):
+        """
+        Count shared telemetry entries per round, and those attributed to each row's player
+
+        Returns:
+            (entries in the row's round, entries in that round tagged with the row's player)
+        """
+        round_codes = panel['round_id'].cat.codes.to_numpy().astype(np.int64)
+        player_codes = panel['player_id'].cat.codes.to_numpy().astype(np.int64)
+        n_rounds = len(panel['round_id'].cat.categories)
+        n_players = len(panel['player_id'].cat.categories)
+
+        entries = self.telemetry[['round_id', 'shared_telemetry']].explode('shared_telemetry').dropna()
+        entry_rounds = panel['round_id'].cat.categories.get_indexer(entries['round_id'])
+        entry_players = panel['player_id'].cat.categories.get_indexer(
+            [e.get('playerId') if isinstance(e, dict) else None for e in entries['shared_telemetry']]
+        )
+        known = entry_rounds >= 0
+
+        per_round = np.bincount(entry_rounds[known], minlength=n_rounds)
+        shared = np.where(round_codes >= 0, per_round[np.maximum(round_codes, 0)], 0)
+
+        # Entries tagged with a player ID, keyed as round * players + player
+        tagged = known & (entry_players >= 0)
+        pair_keys, pair_counts = np.unique(
+            entry_rounds[tagged].astype(np.int64) * n_players + entry_players[tagged],
+            return_counts=True,
+        )
+        row_keys = round_codes * n_players + player_codes
+        pos = np.clip(np.searchsorted(pair_keys, row_keys), 0, max(len(pair_keys) - 1, 0))
+        own = np.zeros(len(panel), dtype=np.int64)
+        if len(pair_keys):
+            hit = pair_keys[pos] == row_keys
+            own[hit] = pair_counts[pos[hit]]
+        return shared, own
+
+    def _stored_history(self, panel: pd.DataFrame, position: np.ndarray) -> np.ndarray:
+        """Look up each row's entry in its player's stored leakageHistory"""
+        histories = self.histories.set_index('player_id')['leakage_history']
+        histories = histories.reindex(panel['player_id'].cat.categories)
+        lengths = np.array([len(h) if isinstance(h, list) else 0 for h in histories], dtype=np.int64)
+        flat = pd.to_numeric(
+            pd.Series([v for h in histories if isinstance(h, list) for v in h], dtype=object),
+            errors='coerce',
+        ).to_numpy(dtype=float)
+        offsets = np.r_[0, np.cumsum(lengths)[:-1]] if len(lengths) else np.empty(0, dtype=np.int64)
+
+        codes = panel['player_id'].cat.codes.to_numpy()
+        valid = (codes >= 0) & (position < lengths[np.maximum(codes, 0)] if len(lengths) else False)
+        stored = np.full(len(panel), np.nan)
+        stored[valid] = flat[offsets[codes[valid]] + position[valid]]
+        return stored
+
+    def _unique_signals(self, panel: pd.DataFrame) -> np.ndarray:
+        """Count distinct own + learned signals for each row's player"""
+        signals = pd.Series(
+            [a + b for a, b in zip(self.histories['threat_portfolio'], self.histories['learned_signals'])],
+            index=self.histories['player_id'],
+        )
+        unique = signals.explode().groupby(level=0, sort=False).nunique()
+        unique = unique.reindex(panel['player_id'].cat.categories, fill_value=0).to_numpy()
+        codes = panel['player_id'].cat.codes.to_numpy()
+        return np.where(codes >= 0, unique[np.maximum(codes, 0)], 0)
+
+    def audit(self) -> pd.DataFrame:
+        """
+        Recompute each player-round and flag stored values that diverge
+
+        Returns:
+            One row per player-round with recomputed components and mismatch flags
+        """
+        panel = self._ordered_panel()
+        n = len(panel)
+
+        task = panel['task'].astype(object).to_numpy()
+        collab = task == 'collaboration'
+        competition = task == 'competition'
+        amount = panel['disclosure_amount'].astype(object).to_numpy()
+        disclosed = pd.notna(amount) & (amount != 'none')
+
+        # Leakage intensity (calculateLeakageIntensity); only set in collaboration rounds
+        shared, own_entries = self._telemetry_counts(panel)
+        others = shared - own_entries
+        own_sharing = disclosed.astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            leakage = np.where(others > 0, np.maximum(0.0, (others - own_sharing) / others), 0.0)
+        leakage = np.where(collab, leakage, 0.0)
+
+        # leakageHistory gets one entry per round; competition uses the average so far
+        player_codes = panel['player_id'].cat.codes.to_numpy()
+        starts = np.flatnonzero(np.r_[True, player_codes[1:] != player_codes[:-1]]) if n else np.empty(0, dtype=np.int64)
+        position = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n])) if n else np.empty(0, dtype=np.int64)
+        cumulative = _segment_cumsum(leakage, starts) if n else np.empty(0)
+        running_average = cumulative / (position + 1)
+        prior_average = (cumulative - leakage) / np.maximum(position, 1)
+
+        # AI accuracy and detection improvement
+        volatile = (panel['threat_volatility'].astype(object).to_numpy() == 'volatile').astype(float)
+        ai_accuracy = np.minimum(MAX_ACCURACY, BASE_AI_ACCURACY + TELEMETRY_BONUS * shared - VOLATILITY_PENALTY * volatile)
+        baseline = panel['baseline_detection'].fillna(DEFAULT_BASELINE_DETECTION).to_numpy(dtype=float)
+        capacity = panel['absorptive_capacity'].astype(object).to_numpy()
+        learning_rate = np.array([LEARNING_RATES.get(c, DEFAULT_LEARNING_RATE) for c in capacity], dtype=float)
+        detection = np.minimum(MAX_ACCURACY, baseline + (ai_accuracy - baseline) * learning_rate)
+
+        # Collaboration payoff = exposure * detection * 10 - cost, with exposure ~ U(0, 100)
+        disclosure_cost = np.array([DISCLOSURE_COSTS.get(a, 25.0) if d else 0.0 for a, d in zip(amount, disclosed)])
+        payoff = panel['payoff'].to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            implied_exposure = (payoff + disclosure_cost) / (PAYOFF_PER_ATTACK * detection)
+
+        # Competition payoff = (base + 5 * signals - penalty) / 100 * 200, with base ~ U(0, 100)
+        auditable = panel['governance_regime'].astype(object).to_numpy() == 'auditable'
+        signal_advantage = SIGNAL_ADVANTAGE * self._unique_signals(panel)
+        reputation_penalty = np.where(auditable, REPUTATION_PENALTY * prior_average, 0.0)
+        score = panel['competition_score'].to_numpy(dtype=float, na_value=np.nan)
+        implied_base_score = score - signal_advantage + reputation_penalty
+
+        expected_payoff = np.select(
+            [collab, competition],
+            [PAYOFF_PER_ATTACK * MAX_ATTACK_EXPOSURE / 2 * detection - disclosure_cost,
+             (MAX_BASE_SCORE / 2 + signal_advantage - reputation_penalty) / 100 * CONTRACT_VALUE],
+            default=np.nan,
+        )
+
+        result = pd.DataFrame({
+            'player_round_id': panel['player_round_id'],
+            'game_id': panel['game_id'],
+            'player_id': panel['player_id'],
+            'round_id': panel['round_id'],
+            'round_index': panel['round_index'],
+            'task': panel['task'],
+            'shared_count': shared,
+            'others_sharing': others,
+            'leakage_intensity': leakage,
+            'running_avg_leakage': running_average,
+            'ai_accuracy': np.where(collab, ai_accuracy, np.nan),
+            'detection_accuracy': np.where(collab, detection, np.nan),
+            'disclosure_cost': disclosure_cost,
+            'implied_attack_exposure': np.where(collab, implied_exposure, np.nan),
+            'signal_advantage': np.where(competition, signal_advantage, np.nan),
+            'reputation_penalty': np.where(competition, reputation_penalty, np.nan),
+            'implied_base_score': np.where(competition, implied_base_score, np.nan),
+            'expected_payoff': expected_payoff,
+            'stored_payoff': payoff,
+            'stored_leakage_history': self._stored_history(panel, position),
+        })
+
+        result['flag_leakage'] = self._diverges(panel['leakage_intensity'], leakage, collab)
+        result['flag_leakage_history'] = self._diverges(result['stored_leakage_history'], leakage, np.ones(n, dtype=bool))
+        result['flag_ai_accuracy'] = self._diverges(panel['ai_model_accuracy'], ai_accuracy, collab)
+        result['flag_detection'] = self._diverges(panel['detection_accuracy'], detection, collab)
+        result['flag_payoff'] = (
+            (collab & self._outside(implied_exposure, 0.0, MAX_ATTACK_EXPOSURE))
+            | (competition & self._outside(implied_base_score, 0.0, MAX_BASE_SCORE))
+            | (competition & self._diverges(panel['payoff'], score / 100 * CONTRACT_VALUE, competition))
+        )
+        flag_columns = [c for c in result.columns if c.startswith('flag_')]
+        result['flagged'] = result[flag_columns].any(axis=1)
+        return result
+
+    def _diverges(self, stored: pd.Series, expected: np.ndarray, applies: np.ndarray) -> np.ndarray:
+        """Stored value present and further than atol from the recomputed value"""
+        stored = np.asarray(pd.to_numeric(stored, errors='coerce'), dtype=float)
+        return applies & ~np.isnan(stored) & ~(np.abs(stored - expected) <= self.atol)
+
+    def _outside(self, implied: np.ndarray, low: float, high: float) -> np.ndarray:
+        """Implied random draw present but outside its sampling range"""
+        return ~np.isnan(implied) & ((implied < low - self.atol) | (implied > high + self.atol))
+
+    def summarize(self, audit_df: pd.DataFrame) -> Dict[str, int]:
+        """Count flagged rows per check"""
+        summary = {'player_rounds': len(audit_df), 'flagged': int(audit_df['flagged'].sum())}
+        for column in audit_df.columns:
+            if column.startswith('flag_'):
+                summary[column] = int(audit_df[column].sum())
+        return summary
+
+
+def main():
+    """Main function for command-line usage"""
+    parser = argparse.ArgumentParser(
+        description='Audit stored payoffs against the experiment game rules'
+    )
+    parser.add_argument(
+        '--data-file',
+        default='.empirica/local/tajriba.json',
+        help='Path to Empirica data file (default: .empirica/local/tajriba.json)'
+    )
+    parser.add_argument(
+        '--output',
+        help='Optional CSV path for the full audit table'
+    )
+
+    args = parser.parse_args()
+
+    try:
+        auditor = PayoffAuditor.from_extractor(EmpiricaDataExtractor(args.data_file))
+        audit_df = auditor.audit()
+    except FileNotFoundError as e:
+        print(f"\n✗ Error: {e}")
+        print(f"  Make sure Empirica has been run and data exists.")
+        return 1
+
+    print("\n" + "="*60)
+    print("PAYOFF AUDIT")
+    print("="*60)
+    for key, value in auditor.summarize(audit_df).items():
+        print(f"  {key}: {value}")
+
+    if args.output:
+        audit_df.to_csv(args.output, index=False)
+        print(f"\n✓ Audit table saved to {args.output}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Chat Search Index for the Cybersecurity Intelligence Sharing Experiment
+Tokenized inverted index and message-rate aggregates over extracted chat messages
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Union
+
+
+# Keep hyphenated identifiers such as THREAT-9I1MQE as a single token
+TOKEN_PATTERN = r"[a-z0-9]+(?:-[a-z0-9]+)*"
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search tokens"""
+    if not isinstance(text, str):
+        return []
+    return re.findall(TOKEN_PATTERN, text.lower())
+
+
+class ChatSearchIndex:
+    """Inverted index mapping chat tokens to the messages that contain them"""
+
+    def __init__(self, chat_df: pd.DataFrame):
+        """
+        Build the index from extracted chat messages
+
+        Args:
+            chat_df: Output of EmpiricaDataExtractor.extract_chat_messages()
+        """
+        self.messages = chat_df.reset_index(drop=True)
+        if 'round_id' not in self.messages.columns:
+            self.messages['round_id'] = None
+
+        # Integer codes so game/round filters are array comparisons; missing IDs
+        # are coded -1, which _code_for never returns for a known ID
+        self.game_codes, self.game_ids = pd.factorize(self.messages['game_id'])
+        self.round_codes, self.round_ids = pd.factorize(self.messages['round_id'])
+        self.message_ids = self.messages['message_id'].to_numpy()
+
+        self.postings = self._build_postings()
+
+    def _build_postings(self) -> Dict[str, np.ndarray]:
+        """Map each token to the sorted row positions of messages containing it"""
+        if self.messages.empty:
+            return {}
+
+        tokens = (
+            self.messages['text']
+            .fillna('')
+            .astype(str)
+            .str.lower()
+            .str.findall(TOKEN_PATTERN)
+            .explode()
+            .dropna()
+        )
+        if tokens.empty:
+            return {}
+
+        # One posting per (token, message), grouped by token with positions ascending
+        pairs = pd.DataFrame({'token': tokens.to_numpy(), 'row': tokens.index.to_numpy()})
+        pairs = pairs.drop_duplicates().sort_values(['token', 'row'])
+        token_values = pairs['token'].to_numpy()
+        rows = pairs['row'].to_numpy(dtype=np.int64)
+        starts = np.flatnonzero(np.r_[True, token_values[1:] != token_values[:-1]])
+        return dict(zip(token_values[starts], np.split(rows, starts[1:])))
+
+    @property
+    def num_messages(self) -> int:
+        return len(self.messages)
+
+    @property
+    def num_tokens(self) -> int:
+        return len(self.postings)
+
+    def _code_for(self, labels: pd.Index, value) -> int:
+        """Translate a game/round ID into its integer code (-1 if unknown)"""
+        return int(labels.get_indexer([value])[0])
+
+    def lookup(self, query: Union[str, List[str]], game_id: str = None,
+               round_id: str = None, match: str = 'all') -> np.ndarray:
+        """
+        Find row positions of messages matching the query
+
+        Args:
+            query: Search text (tokenized) or list of tokens
+            game_id: Restrict results to one game
+            round_id: Restrict results to one round
+            match: 'all' requires every token, 'any' accepts at least one
+        """
+        tokens = tokenize(query) if isinstance(query, str) else [t.lower() for t in query]
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+
+        empty = np.empty(0, dtype=np.int64)
+        lists = [self.postings.get(token, empty) for token in tokens]
+        if match == 'all':
+            # Intersect shortest posting lists first
+            lists.sort(key=len)
+            rows = lists[0]
+            for other in lists[1:]:
+                rows = np.intersect1d(rows, other, assume_unique=True)
+        elif match == 'any':
+            rows = np.unique(np.concatenate(lists))
+        else:
+            raise ValueError(f"match must be 'all' or 'any', got {match!r}")
+
+        for value, codes, labels in ((game_id, self.game_codes, self.game_ids),
+                                     (round_id, self.round_codes, self.round_ids)):
+            if value is None:
+                continue
+            code = self._code_for(labels, value)
+            if code < 0:
+                return empty
+            rows = rows[codes[rows] == code]
+        return rows
+
+    def search(self, query: Union[str, List[str]], game_id: str = None,
+               round_id: str = None, match: str = 'all') -> pd.DataFrame:
+        """Return the chat messages matching the query"""
+        return self.messages.iloc[self.lookup(query, game_id, round_id, match)]
+
+    def token_postings(self, token: str) -> pd.DataFrame:
+        """Break down a token's postings by game and round"""
+        rows = self.postings.get(token.lower(), np.empty(0, dtype=np.int64))
+        hits = pd.DataFrame({
+            'game_id': self.messages['game_id'].to_numpy()[rows],
+            'round_id': self.messages['round_id'].to_numpy()[rows],
+            'message_id': self.message_ids[rows],
+        })
+        return (
+            hits.groupby(['game_id', 'round_id'], dropna=False, sort=False)['message_id']
+            .agg(['count', list])
+            .rename(columns={'list': 'message_ids'})
+            .reset_index()
+        )
+
+
+def compute_message_rates(chat_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute per-player chat activity aggregates
+
+    Args:
+        chat_df: Output of EmpiricaDataExtractor.extract_chat_messages()
+
+    Returns:
+        One row per (game_id, player_id) with message counts and rates
+    """
+    columns = [
+        'game_id', 'player_id', 'message_count', 'total_chars',
+        'first_message_at', 'last_message_at', 'active_minutes', 'messages_per_minute',
+    ]
+    if chat_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    df = chat_df.assign(
+        timestamp=pd.to_numeric(chat_df['timestamp'], errors='coerce'),
+        chars=chat_df['text'].fillna('').astype(str).str.len(),
+    )
+    rates = df.groupby(['game_id', 'player_id'], sort=False).agg(
+        message_count=('message_id', 'size'),
+        total_chars=('chars', 'sum'),
+        first_message_at=('timestamp', 'min'),
+        last_message_at=('timestamp', 'max'),
+    ).reset_index()
+
+    # Players with no time span (e.g. a single message) get a one-minute window
+    # instead of a zero division; everyone else is rated over their actual span
+    rates['active_minutes'] = (rates['last_message_at'] - rates['first_message_at']) / 60000.0
+    window = rates['active_minutes'].where(rates['active_minutes'] > 0, 1.0)
+    rates['messages_per_minute'] = rates['message_count'] / window
+    return rates[columns]
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Experiment Design Sweep for the Cybersecurity Intelligence Sharing Experiment
+Runs batched simulations (or bootstrap resamples of collected data) over a grid of treatment configurations
+"""
+
+import json
+import time
+import hashlib
+import warnings
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Any, Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from audit_payoffs import (
+    BASE_AI_ACCURACY, TELEMETRY_BONUS, VOLATILITY_PENALTY, MAX_ACCURACY,
+    DEFAULT_BASELINE_DETECTION, LEARNING_RATES, DEFAULT_LEARNING_RATE, DISCLOSURE_COSTS,
+    MAX_ATTACK_EXPOSURE, PAYOFF_PER_ATTACK, MAX_BASE_SCORE, SIGNAL_ADVANTAGE,
+    REPUTATION_PENALTY, CONTRACT_VALUE,
+)
+
+
+# Treatment factors as used in the batch config (see TREATMENT_GUIDE.md)
+DEFAULT_GRID = {
+    'playerCount': [2, 4, 6],
+    'collaborationRounds': [3],
+    'competitionRounds': [2],
+    'governanceRegime': ['open', 'anonymized', 'auditable'],
+    'absorptiveCapacity': ['high', 'low'],
+    'threatVolatility': ['stable', 'volatile'],
+}
+
+# Simulated disclosure choice probabilities for none / partial / full
+DEFAULT_DISCLOSURE_PROBS = (1 / 3, 1 / 3, 1 / 3)
+
+# Portfolio size is drawn from 5-9 signatures (generateThreatPortfolio)
+MIN_PORTFOLIO = 5
+MAX_PORTFOLIO = 9
+
+# Treatment factors that the extracted panel records per game
+PANEL_FACTORS = {
+    'playerCount': 'player_count',
+    'collaborationRounds': 'collaboration_rounds',
+    'competitionRounds': 'competition_rounds',
+    'governanceRegime': 'governance_regime',
+    'absorptiveCapacity': 'absorptive_capacity',
+    'threatVolatility': 'threat_volatility',
+}
+
+
+def unmatched_factors(cell: Dict[str, Any]):
+    """Comma-separated cell factors outside the game model / panel, or None"""
+    return ','.join(sorted(set(cell) - set(PANEL_FACTORS))) or None
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Expand factor -> values lists into one treatment dict per cell"""
+    factors = list(grid)
+    return [dict(zip(factors, values)) for values in itertools.product(*(grid[f] for f in factors))]
+
+
+def cell_key(cell: Dict[str, Any]) -> str:
+    """Stable identifier for a treatment cell, used for checkpointing and seeding"""
+    return hashlib.sha1(json.dumps(cell, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def simulate_cell(cell: Dict[str, Any], replications: int, rng: np.random.Generator,
+                  disclosure_probs=DEFAULT_DISCLOSURE_PROBS) -> Dict[str, float]:
+    """
+    Simulate a batch of games for one treatment cell
+
+    All replications, rounds and players are drawn and scored as arrays,
+    following the rules in server/src/callbacks.js. Cell factors the model
+    does not use are listed in unmatched_factors.
+
+    Args:
+        cell: Treatment factors
+        replications: Number of games to simulate
+        rng: Random generator for this cell
+        disclosure_probs: Probabilities of choosing none / partial / full
+    """
+    n_players = int(cell.get('playerCount', 4))
+    n_collab = int(cell.get('collaborationRounds', 3))
+    n_comp = int(cell.get('competitionRounds', 2))
+    regime = cell.get('governanceRegime', 'open')
+    volatile = cell.get('threatVolatility') == 'volatile'
+    learning_rate = LEARNING_RATES.get(cell.get('absorptiveCapacity'), DEFAULT_LEARNING_RATE)
+
+    # Collaboration rounds: disclosure -> shared telemetry -> AI accuracy -> detection
+    choice = rng.choice(3, size=(replications, n_collab, n_players), p=disclosure_probs)
+    disclosed = choice > 0
+    shared = disclosed.sum(axis=2, keepdims=True)
+    ai_accuracy = np.minimum(MAX_ACCURACY, BASE_AI_ACCURACY + TELEMETRY_BONUS * shared
+                             - (VOLATILITY_PENALTY if volatile else 0.0))
+    detection = np.minimum(MAX_ACCURACY, DEFAULT_BASELINE_DETECTION
+                           + (ai_accuracy - DEFAULT_BASELINE_DETECTION) * learning_rate)
+
+    cost = np.select([choice == 2, choice == 1], [DISCLOSURE_COSTS['full'], DISCLOSURE_COSTS['partial']], 0.0)
+    exposure = rng.uniform(0.0, MAX_ATTACK_EXPOSURE, size=choice.shape)
+    collab_payoff = exposure * detection * PAYOFF_PER_ATTACK - cost
+
+    # Anonymized telemetry cannot be told apart from the player's own entry
+    own = disclosed.astype(float)
+    others = shared if regime == 'anonymized' else shared - own
+    with np.errstate(divide='ignore', invalid='ignore'):
+        leakage = np.where(others > 0, np.maximum(0.0, (others - own) / others), 0.0)
+
+    # Competition rounds: history holds the training round, collaboration rounds
+    # and earlier competition rounds, all but collaboration contributing zero
+    history_length = 1 + n_collab + np.arange(n_comp).reshape(1, n_comp, 1)
+    prior_average = leakage.sum(axis=1, keepdims=True) / history_length
+    penalty = REPUTATION_PENALTY * prior_average if regime == 'auditable' else np.zeros_like(prior_average)
+
+    portfolio = rng.integers(MIN_PORTFOLIO, MAX_PORTFOLIO + 1, size=(replications, 1, n_players))
+    base_score = rng.uniform(0.0, MAX_BASE_SCORE, size=(replications, n_comp, n_players))
+    score = base_score + SIGNAL_ADVANTAGE * portfolio - penalty
+    comp_payoff = score / 100 * CONTRACT_VALUE
+
+    total_payoff = collab_payoff.sum(axis=1) + comp_payoff.sum(axis=1)
+    return {
+        'games': replications,
+        'player_rounds': replications * n_players * (1 + n_collab + n_comp),
+        'unmatched_factors': unmatched_factors(cell),
+        'disclosure_rate': float(disclosed.mean()) if disclosed.size else np.nan,
+        'mean_ai_accuracy': float(ai_accuracy.mean()) if ai_accuracy.size else np.nan,
+        'mean_detection': float(detection.mean()) if detection.size else np.nan,
+        'mean_leakage': float(leakage.mean()) if leakage.size else np.nan,
+        'mean_collab_payoff': float(collab_payoff.mean()) if collab_payoff.size else np.nan,
+        'mean_comp_payoff': float(comp_payoff.mean()) if comp_payoff.size else np.nan,
+        'mean_total_payoff': float(total_payoff.mean()),
+        'std_total_payoff': float(total_payoff.std()),
+    }
+
+
+def summarize_games(panel: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce the player x round panel to one row of outcome metrics per game
+
+    Args:
+        panel: Output of EmpiricaDataExtractor.create_analysis_dataset()
+    """
+    df = panel.assign(
+        disclosed=panel['disclosure_amount'].notna() & (panel['disclosure_amount'].astype(object) != 'none'),
+        collab=panel['task'].astype(object) == 'collaboration',
+    )
+    collab = df[df['collab']]
+
+    games = df.groupby('game_id', observed=True).agg(
+        **{column: (column, 'first') for column in PANEL_FACTORS.values()},
+        mean_leakage=('leakage_intensity', 'mean'),
+    )
+    games['disclosure_rate'] = collab.groupby('game_id', observed=True)['disclosed'].mean()
+    games['mean_ai_accuracy'] = collab.groupby('game_id', observed=True)['ai_model_accuracy'].mean()
+    games['mean_detection'] = collab.groupby('game_id', observed=True)['detection_accuracy'].mean()
+    games['mean_total_payoff'] = (
+        df.drop_duplicates('player_id').groupby('game_id', observed=True)['total_payoff'].mean()
+    )
+    return games.reset_index()
+
+
+def bootstrap_cell(cell: Dict[str, Any], replications: int, rng: np.random.Generator,
+                   games: pd.DataFrame) -> Dict[str, float]:
+    """
+    Bootstrap outcome metrics from collected games matching a treatment cell
+
+    Games must match every cell factor recorded in the treatment (player
+    count, round counts, regime, capacity, volatility); each replication
+    resamples the matching games with replacement. Cell factors the panel
+    does not record are listed in unmatched_factors rather than silently
+    attributed to the resampled games.
+    """
+    mask = np.ones(len(games), dtype=bool)
+    for factor, column in PANEL_FACTORS.items():
+        if factor in cell:
+            mask &= games[column].astype(object).eq(cell[factor]).to_numpy(dtype=bool)
+    matched = games[mask]
+
+    metrics = ['disclosure_rate', 'mean_ai_accuracy', 'mean_detection', 'mean_leakage', 'mean_total_payoff']
+    result = {'games': len(matched), 'player_rounds': np.nan,
+              'unmatched_factors': unmatched_factors(cell)}
+    if matched.empty:
+        result.update({m: np.nan for m in metrics})
+        result['se_mean_total_payoff'] = np.nan
+        return result
+
+    values = matched[metrics].to_numpy(dtype=float)
+    samples = rng.integers(0, len(matched), size=(replications, len(matched)))
+
+    # Metrics missing from every matched game stay NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        resampled = np.nanmean(values[samples], axis=1)
+        result.update({m: float(v) for m, v in zip(metrics, np.nanmean(resampled, axis=0))})
+    # Bootstrap standard error of the mean total payoff
+    result['se_mean_total_payoff'] = float(np.nanstd(resampled[:, metrics.index('mean_total_payoff')]))
+    return result
+
+
+def sweep_fingerprint(mode: str, replications: int, seed: int, disclosure_probs,
+                      games: pd.DataFrame = None) -> str:
+    """
+    Identify everything besides the cell factors that determines a cell's result
+
+    Bootstrap sweeps include a hash of the games summary, so results from a
+    different data file are never reused.
+    """
+    settings = {'mode': mode, 'replications': replications, 'seed': seed}
+    if mode == 'simulate':
+        settings['disclosure_probs'] = [float(p) for p in disclosure_probs]
+    if games is not None and mode == 'bootstrap':
+        settings['data'] = int(pd.util.hash_pandas_object(games, index=False).sum())
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _run_cells(cells: List[Dict[str, Any]], mode: str, replications: int, seed: int,
+               games: pd.DataFrame = None, disclosure_probs=DEFAULT_DISCLOSURE_PROBS) -> List[Dict[str, Any]]:
+    """Worker entry point: run a chunk of cells and time each one"""
+    rows = []
+    for cell in cells:
+        key = cell_key(cell)
+        rng = np.random.default_rng([seed, int(key, 16)])
+
+        started = time.perf_counter()
+        if mode == 'simulate':
+            metrics = simulate_cell(cell, replications, rng, disclosure_probs)
+        else:
+            metrics = bootstrap_cell(cell, replications, rng, games)
+        elapsed = time.perf_counter() - started
+
+        rows.append({
+            'cell_id': key,
+            **cell,
+            'mode': mode,
+            'replications': replications,
+            'seed': seed,
+            **metrics,
+            'elapsed_s': elapsed,
+            'replications_per_s': replications / elapsed if elapsed > 0 else np.nan,
+        })
+    return rows
+
+
+class DesignSweepRunner:
+    """Fan a grid of treatment cells across a process pool with resumable checkpoints"""
+
+    def __init__(self, cells: Iterable[Dict[str, Any]], mode: str = 'simulate',
+                 replications: int = 1000, seed: int = 0, workers: int = None,
+                 checkpoint: str = None, chunk_size: int = 8, games: pd.DataFrame = None,
+                 disclosure_probs=DEFAULT_DISCLOSURE_PROBS):
+        """
+        Initialize the sweep
+
+        Args:
+            cells: Treatment configurations, e.g. from expand_grid()
+            mode: 'simulate' for game-model simulation, 'bootstrap' to resample collected games
+            replications: Simulated games or bootstrap resamples per cell
+            seed: Base seed; each cell derives its own stream from it
+            workers: Process pool size (default: number of CPUs)
+            checkpoint: JSONL file of finished cells, appended as results arrive
+            chunk_size: Cells per pool task
+            games: Per-game summary from summarize_games(), required for bootstrap
+            disclosure_probs: Simulated none / partial / full probabilities
+        """
+        if mode not in ('simulate', 'bootstrap'):
+            raise ValueError(f"mode must be 'simulate' or 'bootstrap', got {mode!r}")
+        if mode == 'bootstrap' and games is None:
+            raise ValueError("bootstrap mode requires a games summary")
+
+        self.cells = list(cells)
+        self.mode = mode
+        self.replications = replications
+        self.seed = seed
+        self.workers = workers
+        self.checkpoint = Path(checkpoint) if checkpoint else None
+        self.chunk_size = chunk_size
+        self.games = games
+        self.disclosure_probs = disclosure_probs
+        self.fingerprint = sweep_fingerprint(mode, replications, seed, disclosure_probs, games)
+
+    def _load_checkpoint(self) -> List[Dict[str, Any]]:
+        """
+        Read finished rows from the checkpoint file, skipping a torn last line
+
+        Rows written by a sweep with a different seed, disclosure model,
+        replication count or data file are ignored.
+        """
+        if self.checkpoint is None or not self.checkpoint.exists():
+            return []
+
+        rows = []
+        ignored = 0
+        with open(self.checkpoint, 'r') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if row.get('sweep_id') == self.fingerprint:
+                    rows.append(row)
+                else:
+                    ignored += 1
+
+        if ignored:
+            print(f"  Ignoring {ignored} checkpointed cells from a sweep with different settings")
+        return rows
+
+    def run(self) -> pd.DataFrame:
+        """Run all unfinished cells and return one tidy row per cell"""
+        self._trim_torn_checkpoint()
+        done = {row['cell_id']: row for row in self._load_checkpoint()}
+        pending = [cell for cell in self.cells if cell_key(cell) not in done]
+        if done:
+            print(f"✓ Resuming sweep: {len(done)} cells checkpointed, {len(pending)} remaining")
+
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        started = time.perf_counter()
+
+        if chunks:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = [
+                    pool.submit(_run_cells, chunk, self.mode, self.replications, self.seed,
+                                self.games, self.disclosure_probs)
+                    for chunk in chunks
+                ]
+                for future in as_completed(futures):
+                    rows = [{'sweep_id': self.fingerprint, **row} for row in future.result()]
+                    self._append_checkpoint(rows)
+                    for row in rows:
+                        done[row['cell_id']] = row
+
+        wall = time.perf_counter() - started
+        results = pd.DataFrame([done[cell_key(cell)] for cell in self.cells if cell_key(cell) in done])
+        print(f"✓ Swept {len(pending)} cells in {wall:.1f}s ({len(results)} total)")
+        return results
+
+    def _trim_torn_checkpoint(self):
+        """Drop a partial last line left by an interrupted write so appends start on a fresh line"""
+        if self.checkpoint is None or not self.checkpoint.exists():
+            return
+        with open(self.checkpoint, 'rb+') as f:
+            if f.seek(0, 2) == 0:
+                return
+            f.seek(-1, 2)
+            if f.read(1) == b'\n':
+                return
+            f.seek(0)
+            f.truncate(f.read().rfind(b'\n') + 1)
+
+    def _append_checkpoint(self, rows: List[Dict[str, Any]]):
+        """Append finished rows to the checkpoint file"""
+        if self.checkpoint is None:
+            return
+        with open(self.checkpoint, 'a') as f:
+            for row in rows:
+                f.write(json.dumps(row, default=float) + '\n')
+
+
+def main():
+    """Main function for command-line usage"""
+    parser = argparse.ArgumentParser(
+        description='Sweep treatment configurations for the cybersecurity experiment'
+    )
+    parser.add_argument(
+        '--grid',
+        help='JSON file mapping treatment factors to lists of values (default: built-in grid)'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=['simulate', 'bootstrap'],
+        default='simulate',
+        help='Simulate the game model or bootstrap collected data (default: simulate)'
+    )
+    parser.add_argument(
+        '--data-file',
+        default='.empirica/local/tajriba.json',
+        help='Path to Empirica data file for bootstrap mode (default: .empirica/local/tajriba.json)'
+    )
+    parser.add_argument('--replications', type=int, default=1000, help='Games or resamples per cell (default: 1000)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: all CPUs)')
+    parser.add_argument('--seed', type=int, default=0, help='Base random seed (default: 0)')
+    parser.add_argument('--checkpoint', default='sweep_checkpoint.jsonl', help='Checkpoint file (default: sweep_checkpoint.jsonl)')
+    parser.add_argument('--output', default='sweep_results.csv', help='Output CSV (default: sweep_results.csv)')
+
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid, 'r') as f:
+            grid = json.load(f)
+
+    games = None
+    if args.mode == 'bootstrap':
+        from extract_data import EmpiricaDataExtractor
+        try:
+            games = summarize_games(EmpiricaDataExtractor(args.data_file).create_analysis_dataset())
+        except FileNotFoundError as e:
+            print(f"\n✗ Error: {e}")
+            print(f"  Make sure Empirica has been run and data exists.")
+            return 1
+
+    runner = DesignSweepRunner(
+        expand_grid(grid),
+        mode=args.mode,
+        replications=args.replications,
+        seed=args.seed,
+        workers=args.workers,
+        checkpoint=args.checkpoint,
+        games=games,
+    )
+    results = runner.run()
+    results.to_csv(args.output, index=False)
+    print(f"✓ Sweep results saved to {args.output}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
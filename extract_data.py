@@ -5,12 +5,15 @@ Extracts and processes data from the cybersecurity intelligence sharing experime
 """
 
 import json
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Any
 import argparse
 
+from chat_index import ChatSearchIndex, compute_message_rates
+
 
 class EmpiricaDataExtractor:
     """Extract and process Empirica experiment data"""
@@ -203,128 +206,230 @@ class EmpiricaDataExtractor:
         print(f"✓ Extracted {len(self.rounds)} rounds")
         return self.rounds
     
+    def _scope_frame(self, kind: str, keys: List[str]) -> pd.DataFrame:
+        """
+        Collect the final value of selected attributes for every scope of a kind
+        
+        Single pass over the attributes; only the surviving version of each
+        attribute is JSON-decoded.
+        
+        Args:
+            kind: Scope kind (e.g. 'playerRound', 'player', 'round', 'game')
+            keys: Attribute keys to collect, one column each
+        """
+        scope_ids = [s.get('id') for s in self.data.get('scopes', []) if s.get('kind') == kind]
+        wanted = set(keys)
+        latest = {scope_id: {} for scope_id in scope_ids}
+        
+        for attr in self.data.get('attributes', []):
+            node_attrs = latest.get(attr.get('nodeID'))
+            if node_attrs is not None and attr.get('key') in wanted:
+                node_attrs[attr.get('key')] = attr.get('val')
+        
+        rows = []
+        for scope_id in scope_ids:
+            row = {}
+            for key, val in latest[scope_id].items():
+                # Parse JSON values
+                try:
+                    if val and isinstance(val, str):
+                        val = json.loads(val)
+                except json.JSONDecodeError:
+                    pass
+                row[key] = val
+            rows.append(row)
+        
+        frame = pd.DataFrame(rows, columns=keys, index=pd.Index(scope_ids, name='id'))
+        return frame.astype(object).where(frame.notna(), None)
+    
+    def _player_round_frame(self) -> pd.DataFrame:
+        """Build one row per playerRound scope, linked to its player, round and game"""
+        pr = self._scope_frame('playerRound', [
+            'playerID', 'roundID', 'gameID', 'disclosureDecision', 'competitionStrategy',
+            'payoff', 'competitionScore', 'detectionAccuracy', 'leakageIntensity',
+        ])
+        
+        decisions = [d if isinstance(d, dict) else {} for d in pr['disclosureDecision']]
+        signals = [d.get('signals') for d in decisions]
+        
+        return pd.DataFrame({
+            'player_round_id': pr.index.to_numpy(),
+            'player_id': pr['playerID'].to_numpy(),
+            'round_id': pr['roundID'].to_numpy(),
+            'game_id': pr['gameID'].to_numpy(),
+            'has_disclosure': np.array([bool(d) for d in decisions], dtype=bool),
+            'disclosure_amount': [d.get('amount') for d in decisions],
+            'disclosure_resolution': [d.get('resolution') for d in decisions],
+            'num_signals_shared': [len(sig) if sig else 0 for sig in signals],
+            'signals_shared': signals,
+            'strategy': pr['competitionStrategy'].to_numpy(),
+            'payoff': pd.to_numeric(pr['payoff'], errors='coerce').to_numpy(),
+            'competition_score': pd.to_numeric(pr['competitionScore'], errors='coerce').to_numpy(),
+            'detection_accuracy': pd.to_numeric(pr['detectionAccuracy'], errors='coerce').to_numpy(),
+            'leakage_intensity': pd.to_numeric(pr['leakageIntensity'], errors='coerce').to_numpy(),
+        })
+    
     def extract_disclosure_decisions(self) -> pd.DataFrame:
         """Extract disclosure decisions from each round"""
-        decisions_data = []
-        
-        # Find playerRound scopes
-        player_round_scopes = [s for s in self.data.get('scopes', []) if s.get('kind') == 'playerRound']
+        pr = self._player_round_frame()
         
-        for pr_scope in player_round_scopes:
-            pr_id = pr_scope.get('id')
-            
-            # Get attributes for this playerRound
-            pr_attrs = {}
-            for attr in self.data.get('attributes', []):
-                if attr.get('nodeID') == pr_id:
-                    key = attr.get('key')
-                    val = attr.get('val')
-                    
-                    # Parse JSON values
-                    try:
-                        if val and isinstance(val, str):
-                            val = json.loads(val)
-                    except:
-                        pass
-                    
-                    pr_attrs[key] = val
-            
-            if 'disclosureDecision' in pr_attrs:
-                decision = pr_attrs['disclosureDecision']
-                if isinstance(decision, dict):
-                    decisions_data.append({
-                        'player_round_id': pr_id,
-                        'disclosure_amount': decision.get('amount'),
-                        'disclosure_resolution': decision.get('resolution'),
-                        'num_signals_shared': len(decision.get('signals', [])) if decision.get('signals') else 0,
-                        'signals_shared': decision.get('signals'),
-                    })
-        
-        decisions_df = pd.DataFrame(decisions_data)
+        decisions_df = pr.loc[pr['has_disclosure'], [
+            'player_round_id', 'player_id', 'round_id', 'game_id',
+            'disclosure_amount', 'disclosure_resolution', 'num_signals_shared', 'signals_shared',
+        ]].reset_index(drop=True)
         print(f"✓ Extracted {len(decisions_df)} disclosure decisions")
         return decisions_df
     
     def extract_competition_strategies(self) -> pd.DataFrame:
         """Extract competition strategies from competition rounds"""
-        strategies_data = []
-        
-        # Find playerRound scopes
-        player_round_scopes = [s for s in self.data.get('scopes', []) if s.get('kind') == 'playerRound']
-        
-        for pr_scope in player_round_scopes:
-            pr_id = pr_scope.get('id')
-            
-            # Get attributes for this playerRound
-            pr_attrs = {}
-            for attr in self.data.get('attributes', []):
-                if attr.get('nodeID') == pr_id:
-                    key = attr.get('key')
-                    val = attr.get('val')
-                    
-                    # Parse JSON values
-                    try:
-                        if val and isinstance(val, str):
-                            val = json.loads(val)
-                    except:
-                        pass
-                    
-                    pr_attrs[key] = val
-            
-            if 'competitionStrategy' in pr_attrs:
-                strategies_data.append({
-                    'player_round_id': pr_id,
-                    'strategy': pr_attrs['competitionStrategy'],
-                    'payoff': pr_attrs.get('payoff'),
-                    'competition_score': pr_attrs.get('competitionScore'),
-                    'detection_accuracy': pr_attrs.get('detectionAccuracy'),
-                })
+        pr = self._player_round_frame()
         
-        strategies_df = pd.DataFrame(strategies_data)
+        strategies_df = pr.loc[pr['strategy'].notna(), [
+            'player_round_id', 'player_id', 'round_id', 'game_id',
+            'strategy', 'payoff', 'competition_score', 'detection_accuracy',
+        ]].reset_index(drop=True)
         print(f"✓ Extracted {len(strategies_df)} competition strategies")
         return strategies_df
     
+    def extract_round_telemetry(self) -> pd.DataFrame:
+        """Extract the final shared telemetry list of each round"""
+        rounds = self._scope_frame('round', ['sharedTelemetry'])
+        return pd.DataFrame({
+            'round_id': rounds.index.to_numpy(),
+            'shared_telemetry': [t if isinstance(t, list) else [] for t in rounds['sharedTelemetry']],
+        })
+    
+    def extract_player_histories(self) -> pd.DataFrame:
+        """Extract the final signal portfolios and leakage history of each player"""
+        players = self._scope_frame('player', ['threatPortfolio', 'learnedSignals', 'leakageHistory'])
+        lists = {
+            col: [v if isinstance(v, list) else [] for v in players[key]]
+            for col, key in [('threat_portfolio', 'threatPortfolio'),
+                             ('learned_signals', 'learnedSignals'),
+                             ('leakage_history', 'leakageHistory')]
+        }
+        return pd.DataFrame({'player_id': players.index.to_numpy(), **lists})
+    
+    def _latest_attributes(self, key: str) -> Dict[str, Any]:
+        """Return the final version of an attribute for every node that has it
+
+        Empirica appends a new attribute record on every update, so earlier
+        versions are superseded by later ones in file order.
+        """
+        latest = {}
+        for attr in self.data.get('attributes', []):
+            if attr.get('key') == key:
+                latest[attr.get('nodeID')] = attr
+        return latest
+    
+    def _round_start_times(self) -> pd.DataFrame:
+        """Get the wall-clock start (epoch ms) of every started round"""
+        round_ids = {s.get('id') for s in self.data.get('scopes', []) if s.get('kind') == 'round'}
+        game_ids = self._latest_attributes('gameID')
+        
+        starts = []
+        for attr in self.data.get('attributes', []):
+            node_id = attr.get('nodeID')
+            if attr.get('key') == 'start' and attr.get('val') == 'true' and node_id in round_ids:
+                game_attr = game_ids.get(node_id)
+                starts.append({
+                    'round_id': node_id,
+                    'game_id': json.loads(game_attr['val']) if game_attr else None,
+                    'started_at': attr.get('createdAt'),
+                })
+        
+        starts_df = pd.DataFrame(starts, columns=['round_id', 'game_id', 'started_at'])
+        # RFC3339Nano drops zero fractions, so parse per-value ISO 8601 and
+        # convert to ms explicitly (pandas infers the datetime unit)
+        started_at = pd.to_datetime(starts_df['started_at'], utc=True, format='ISO8601')
+        starts_df['start_ms'] = (
+            (started_at - pd.Timestamp(0, tz='UTC')) // pd.Timedelta('1ms')
+        ).astype('int64')
+        return starts_df.drop(columns='started_at').drop_duplicates('round_id', keep='first')
+    
     def extract_chat_messages(self) -> pd.DataFrame:
-        """Extract chat messages"""
+        """Extract chat messages from the final chat history of each game"""
         chat_data = []
         
-        # Find game scopes and their chat history
-        game_scopes = [s for s in self.data.get('scopes', []) if s.get('kind') == 'game']
+        # Every message re-writes the whole chatHistory attribute, so only
+        # the final version per game needs to be decoded
+        game_ids = {s.get('id') for s in self.data.get('scopes', []) if s.get('kind') == 'game'}
+        latest_history = self._latest_attributes('chatHistory')
         
-        for game in game_scopes:
-            game_id = game.get('id')
+        for game_id, attr in latest_history.items():
+            if game_id not in game_ids:
+                continue
             
-            # Get chat history attribute
-            for attr in self.data.get('attributes', []):
-                if attr.get('nodeID') == game_id and attr.get('key') == 'chatHistory':
-                    val = attr.get('val')
-                    
-                    try:
-                        if val and isinstance(val, str):
-                            chat_history = json.loads(val)
-                            
-                            if isinstance(chat_history, list):
-                                for msg in chat_history:
-                                    if isinstance(msg, dict):
-                                        chat_data.append({
-                                            'game_id': game_id,
-                                            'message_id': msg.get('id'),
-                                            'player_id': msg.get('playerId'),
-                                            'player_name': msg.get('playerName'),
-                                            'text': msg.get('text'),
-                                            'timestamp': msg.get('timestamp'),
-                                        })
-                    except:
-                        pass
+            val = attr.get('val')
+            try:
+                chat_history = json.loads(val) if val and isinstance(val, str) else []
+            except json.JSONDecodeError:
+                continue
+            
+            if isinstance(chat_history, list):
+                for msg in chat_history:
+                    if isinstance(msg, dict):
+                        chat_data.append({
+                            'game_id': game_id,
+                            'message_id': msg.get('id'),
+                            'player_id': msg.get('playerId'),
+                            'player_name': msg.get('playerName'),
+                            'text': msg.get('text'),
+                            'timestamp': msg.get('timestamp'),
+                        })
+        
+        chat_df = pd.DataFrame(chat_data, columns=[
+            'game_id', 'message_id', 'player_id', 'player_name', 'text', 'timestamp'
+        ])
+        chat_df = self._assign_chat_rounds(chat_df)
         
-        chat_df = pd.DataFrame(chat_data)
         print(f"✓ Extracted {len(chat_df)} chat messages")
         return chat_df
     
+    def _assign_chat_rounds(self, chat_df: pd.DataFrame) -> pd.DataFrame:
+        """Attach the round each message was sent in, by game and timestamp"""
+        chat_df = chat_df.copy()
+        chat_df['round_id'] = None
+        if chat_df.empty:
+            return chat_df
+        
+        starts = self._round_start_times()
+        if starts.empty:
+            return chat_df
+        
+        chat_df['timestamp'] = pd.to_numeric(chat_df['timestamp'], errors='coerce')
+        timed = chat_df['timestamp'].notna() & chat_df['game_id'].isin(starts['game_id'])
+        if not timed.any():
+            return chat_df
+        
+        # Latest round in the same game that started at or before the message
+        messages = chat_df.loc[timed, ['game_id', 'timestamp']].astype({'timestamp': 'int64'})
+        located = pd.merge_asof(
+            messages.reset_index().sort_values('timestamp'),
+            starts[['game_id', 'round_id', 'start_ms']].sort_values('start_ms'),
+            left_on='timestamp',
+            right_on='start_ms',
+            by='game_id',
+            direction='backward',
+        ).set_index('index')
+        
+        chat_df.loc[located.index, 'round_id'] = located['round_id']
+        return chat_df
+    
+    def build_chat_index(self, chat_df: pd.DataFrame = None) -> ChatSearchIndex:
+        """Build a full-text search index over chat messages"""
+        if chat_df is None:
+            chat_df = self.extract_chat_messages()
+        
+        index = ChatSearchIndex(chat_df)
+        print(f"✓ Indexed {index.num_messages} chat messages ({index.num_tokens} distinct tokens)")
+        return index
+    
     def extract_all(self) -> Dict[str, pd.DataFrame]:
         """Extract all data and return as dictionary of DataFrames"""
         self.load_data()
         
-        return {
+        data_dict = {
             'games': self.extract_games(),
             'players': self.extract_players(),
             'rounds': self.extract_rounds(),
@@ -332,6 +437,9 @@ class EmpiricaDataExtractor:
             'competition_strategies': self.extract_competition_strategies(),
             'chat_messages': self.extract_chat_messages(),
         }
+        data_dict['chat_message_rates'] = compute_message_rates(data_dict['chat_messages'])
+        
+        return data_dict
     
     def export_to_csv(self, output_dir: str = "data_export"):
         """Export all data to CSV files"""
@@ -351,36 +459,85 @@ class EmpiricaDataExtractor:
         print(f"\n✓ All data exported to {output_path}/")
         return output_path
     
+    def _dimension_frames(self) -> Dict[str, pd.DataFrame]:
+        """Build player, round and game lookup tables indexed by scope ID"""
+        players = self._scope_frame('player', ['absorptiveCapacity', 'baselineDetection', 'totalPayoff'])
+        players = pd.DataFrame({
+            'absorptive_capacity': players['absorptiveCapacity'],
+            'baseline_detection': pd.to_numeric(players['baselineDetection'], errors='coerce'),
+            'total_payoff': pd.to_numeric(players['totalPayoff'], errors='coerce'),
+        }, index=players.index)
+        
+        rounds = self._scope_frame('round', ['index', 'task', 'aiModelAccuracy'])
+        rounds = pd.DataFrame({
+            'round_index': pd.to_numeric(rounds['index'], errors='coerce'),
+            'task': rounds['task'],
+            'ai_model_accuracy': pd.to_numeric(rounds['aiModelAccuracy'], errors='coerce'),
+        }, index=rounds.index)
+        
+        games = self._scope_frame('game', ['treatment', 'treatmentName'])
+        treatments = [t if isinstance(t, dict) else {} for t in games['treatment']]
+        design = {
+            column: pd.to_numeric(pd.Series([t.get(factor) for t in treatments], dtype=object), errors='coerce').to_numpy()
+            for column, factor in [('player_count', 'playerCount'),
+                                   ('collaboration_rounds', 'collaborationRounds'),
+                                   ('competition_rounds', 'competitionRounds')]
+        }
+        games = pd.DataFrame({
+            'treatment_name': games['treatmentName'],
+            'governance_regime': [t.get('governanceRegime') for t in treatments],
+            'threat_volatility': [t.get('threatVolatility') for t in treatments],
+            **design,
+        }, index=games.index)
+        
+        return {'player_id': players, 'round_id': rounds, 'game_id': games}
+    
+    @staticmethod
+    def _join_dimension(panel: pd.DataFrame, key: str, dimension: pd.DataFrame) -> pd.DataFrame:
+        """
+        Left-join a dimension table onto the panel through integer key codes
+        
+        Each distinct key is hashed once against the dimension index; the
+        per-row join is then a positional take on the codes.
+        """
+        codes = panel[key].cat.codes.to_numpy()
+        positions = dimension.index.get_indexer(panel[key].cat.categories)
+        
+        # Missing or unmatched keys point at a trailing all-missing row
+        rows = np.full(len(codes), -1, dtype=np.int64)
+        if len(positions):
+            rows = np.where(codes >= 0, positions[np.maximum(codes, 0)], -1)
+        rows[rows < 0] = len(dimension)
+        padded = dimension.reset_index(drop=True).reindex(range(len(dimension) + 1))
+        
+        joined = padded.iloc[rows].set_axis(panel.index)
+        return pd.concat([panel, joined], axis=1)
+    
     def create_analysis_dataset(self) -> pd.DataFrame:
-        """Create a merged dataset for analysis"""
-        data_dict = self.extract_all()
+        """
+        Create the player x round panel for analysis
         
-        # Merge disclosure decisions with player and round info
-        df = data_dict['disclosure_decisions'].copy()
+        One row per playerRound scope with its disclosure decision, competition
+        strategy and payoff, joined to player, round and game attributes.
+        Scope IDs and low-cardinality labels are stored as categoricals.
+        """
+        self.load_data()
         
-        # Add player info
-        if not data_dict['players'].empty:
-            df = df.merge(
-                data_dict['players'][['player_id', 'game_id', 'absorptive_capacity', 'total_payoff']],
-                on='player_id',
-                how='left'
-            )
+        df = self._player_round_frame()
+        for key in ('player_id', 'round_id', 'game_id'):
+            df[key] = df[key].astype('category')
         
-        # Add round info
-        if not data_dict['rounds'].empty:
-            df = df.merge(
-                data_dict['rounds'][['round_id', 'round_index', 'task', 'ai_model_accuracy']],
-                on='round_id',
-                how='left'
-            )
-        
-        # Add game info
-        if not data_dict['games'].empty:
-            df = df.merge(
-                data_dict['games'][['game_id', 'governance_regime', 'threat_volatility']],
-                on='game_id',
-                how='left'
-            )
+        for key, dimension in self._dimension_frames().items():
+            df = self._join_dimension(df, key, dimension)
+        
+        for column in ('disclosure_amount', 'disclosure_resolution', 'strategy', 'task',
+                       'absorptive_capacity', 'governance_regime', 'threat_volatility',
+                       'treatment_name'):
+            df[column] = df[column].astype('category')
+        for column in ('round_index', 'player_count', 'collaboration_rounds', 'competition_rounds'):
+            df[column] = df[column].astype('Int64')
+        
+        df = df.sort_values(['game_id', 'player_id', 'round_index'], kind='stable').reset_index(drop=True)
         
         print(f"✓ Created analysis dataset with {len(df)} observations")
         return df